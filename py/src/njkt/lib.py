@@ -4,14 +4,21 @@ Lightweight Python code transformer for injecting debug statements and context m
 """
 
 import ast
+import bisect
+import copy
+import functools
+import hashlib
+import importlib.util
 import json
 import logging
+import marshal
 import sys
-import runpy
 import os
+from importlib.abc import Loader, MetaPathFinder
+from importlib.machinery import PathFinder
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Union
+from dataclasses import dataclass, field
 from contextlib import contextmanager
 
 # Configure logging
@@ -21,30 +28,85 @@ log_level = getattr(
 logging.basicConfig(level=log_level, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+# Optimization level for compiling transformed code. Profiling runs don't
+# want the target's asserts and docstrings in the way, so default to -OO;
+# override with TRANSFORM_OPTIMIZE=0 to keep them.
+try:
+    _optimize_level = int(os.environ.get("TRANSFORM_OPTIMIZE", "2"))
+except ValueError:
+    _optimize_level = 2
+
 # Constants
 DEFAULT_POST_INJECTION = True
 DEFAULT_CONTEXT_ENABLED = True
 
 
-@dataclass
+@functools.lru_cache(maxsize=1024)
+def _parse_expr_cached(source: str, mode: str) -> ast.AST:
+    """Parse a small, fixed expression/statement once and reuse the AST."""
+    return ast.parse(source, mode=mode)
+
+
+def _parse_module(source: Union[str, bytes], filename: str) -> ast.Module:
+    """Parse a whole module for transformation.
+
+    type_comments stays off (the transformer only reads lineno, so there is no
+    reason to pay for type-comment scanning). The returned tree is mutated in
+    place by CodeTransformer, so it must never be memoized and handed out
+    twice; repeated runs are instead deduplicated by the on-disk code cache.
+    """
+    return ast.parse(source, filename=filename, type_comments=False)
+
+
+@dataclass(slots=True, frozen=True)
 class Event:
     line: int
     expr: str  # Python expression to execute
     post: bool = DEFAULT_POST_INJECTION
+    # Pre-parsed form of `expr`: an ast.Expression for eval mode, or a list of
+    # statements for exec mode. None if the expression has invalid syntax.
+    _parsed_expr: Optional[Union[ast.Expression, List[ast.stmt]]] = field(
+        init=False, repr=False, compare=False, default=None
+    )
 
     def __post_init__(self):
         if self.line <= 0:
             raise ValueError(f"Line number must be positive, got {self.line}")
         if not self.expr.strip():
             raise ValueError("Expression cannot be empty")
+        # Expressions are drawn from a small fixed set; interning makes the
+        # parse-cache lookups pointer comparisons.
+        object.__setattr__(self, "expr", sys.intern(self.expr))
+        try:
+            parsed = _parse_expr_cached(self.expr, "eval")
+        except SyntaxError:
+            try:
+                parsed = _parse_expr_cached(self.expr, "exec").body
+            except SyntaxError:
+                # Invalid syntax is reported (and the event skipped) at injection time
+                parsed = None
+        object.__setattr__(self, "_parsed_expr", parsed)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ContextRange:
     start_line: int
     end_line: int
     context: str
     enabled: bool = DEFAULT_CONTEXT_ENABLED
+    # Optional ready-made AST for `context`; callers that already know the
+    # expression shape can pass this and skip the parse (and any quoting
+    # concerns in the string form, which is kept for logging/cache keys).
+    context_ast: Optional[ast.expr] = field(
+        default=None, repr=False, compare=False
+    )
+    # Pre-parsed form of `context`. None if the expression has invalid syntax.
+    _parsed_context: Optional[ast.expr] = field(
+        init=False, repr=False, compare=False, default=None
+    )
+    # Set by the transformer once the range has been wrapped; cheaper than
+    # tracking applied ranges in a tuple-keyed set.
+    _applied: bool = field(init=False, repr=False, compare=False, default=False)
 
     def __post_init__(self):
         if self.start_line <= 0 or self.end_line <= 0:
@@ -55,102 +117,200 @@ class ContextRange:
             )
         if not self.context.strip():
             raise ValueError("Context expression cannot be empty")
+        # Contexts repeat across ranges (same nvtx call shape); interning makes
+        # the parse-cache lookups pointer comparisons.
+        object.__setattr__(self, "context", sys.intern(self.context))
+        if self.context_ast is not None:
+            object.__setattr__(self, "_parsed_context", self.context_ast)
+            return
+        try:
+            parsed = _parse_expr_cached(self.context, "eval").body
+        except SyntaxError:
+            # Invalid syntax is reported (and the range left unwrapped) at wrap time
+            parsed = None
+        object.__setattr__(self, "_parsed_context", parsed)
+
+
+class CodeTransformer:
+    """Handles both event injection and context manager wrapping.
 
+    Instead of ast.NodeTransformer's getattr-based dispatch (which visits every
+    node and rebuilds every field), a hand-written walker descends only into
+    node types that can contain statements, skipping expression subtrees
+    entirely — events and ranges can only attach to statements.
+    """
 
-class CodeTransformer(ast.NodeTransformer):
-    """Handles both event injection and context manager wrapping."""
+    # Statement-list fields per container node type. Scope-level containers
+    # (module/function/class bodies) get range wrapping + event injection;
+    # block-level containers only get event injection.
+    _SCOPE_FIELDS = {
+        ast.Module: ("body",),
+        ast.FunctionDef: ("body",),
+        ast.AsyncFunctionDef: ("body",),
+        ast.ClassDef: ("body",),
+    }
+    _BLOCK_FIELDS = {
+        ast.If: ("body", "orelse"),
+        ast.For: ("body", "orelse"),
+        ast.AsyncFor: ("body", "orelse"),
+        ast.While: ("body", "orelse"),
+        ast.With: ("body",),
+        ast.AsyncWith: ("body",),
+        ast.Try: ("body", "orelse", "finalbody"),
+        ast.ExceptHandler: ("body",),
+        ast.Match: (),  # statement bodies live in its cases
+        ast.match_case: ("body",),
+    }
+    if hasattr(ast, "TryStar"):  # Python 3.11+
+        _BLOCK_FIELDS[ast.TryStar] = ("body", "orelse", "finalbody")
+    # Node types whose except handlers also contain statements
+    _TRY_TYPES = tuple(
+        t for t in (ast.Try, getattr(ast, "TryStar", None)) if t is not None
+    )
 
     def __init__(self, events: List[Event], ranges: List[ContextRange]):
         self.events = {e.line: e for e in events}
         self.ranges = sorted(
             [r for r in ranges if r.enabled], key=lambda r: r.start_line
         )
-        self.applied_ranges = set()
-
-    def visit_Module(self, node: ast.Module) -> ast.Module:
-        node.body = self._process_body(node.body)
-        return self.generic_visit(node)
+        # Snapshot the debug flag once: per-statement logger.debug calls would
+        # otherwise format their f-strings even when debug logging is off.
+        self._debug = logger.isEnabledFor(logging.DEBUG)
+        # Fast-reject window: events are typically sparse, so most statements
+        # can skip the dict lookup with two int comparisons.
+        self._event_lo = min(self.events) if self.events else 1
+        self._event_hi = max(self.events) if self.events else 0
+        # Index ranges by start line (a list per line: ranges may nest at the
+        # same start line) to replace the linear scan in _wrap_ranges.
+        self._range_starts: Dict[int, List[ContextRange]] = {}
+        for r in self.ranges:
+            # Clear any applied flag left over from a previous transform of
+            # the same config (e.g. transform_only followed by run)
+            object.__setattr__(r, "_applied", False)
+            self._range_starts.setdefault(r.start_line, []).append(r)
+        # Sorted start lines for the bisect precheck in _process_body
+        self._range_start_keys = sorted(self._range_starts)
+
+    def walk(self, node: ast.AST) -> ast.AST:
+        """Rewrite statement bodies in-place, descending only into statement containers."""
+        node_type = type(node)
+        fields = self._SCOPE_FIELDS.get(node_type)
+        if fields is not None:
+            process = self._process_body
+            if node_type is ast.FunctionDef and self._debug:
+                logger.debug(
+                    f"Processing function {node.name} with {len(node.body)} statements"
+                )
+        else:
+            fields = self._BLOCK_FIELDS.get(node_type)
+            if fields is None:
+                return node
+            process = self._inject_events
+
+        walk = self.walk
+        for field_name in fields:
+            body = getattr(node, field_name)
+            if body:
+                setattr(node, field_name, process(body))
+                for child in getattr(node, field_name):
+                    walk(child)
+
+        if node_type in self._TRY_TYPES:
+            for handler in node.handlers:
+                walk(handler)
+        elif node_type is ast.Match:
+            for case in node.cases:
+                walk(case)
+        return node
+
+    def reset(self):
+        """Clear per-transform state so this transformer can walk another tree."""
+        for r in self.ranges:
+            object.__setattr__(r, "_applied", False)
 
-    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.FunctionDef:
-        logger.debug(
-            f"Processing function {node.name} with {len(node.body)} statements"
+    def _process_body(self, statements: List[ast.stmt]) -> List[ast.stmt]:
+        """Common processing for statement bodies: wrap ranges then inject events.
+
+        Bodies whose line window contains no range start and no event line are
+        returned untouched, skipping both passes — the common case for all but
+        a handful of function bodies.
+        """
+        body_lo = next(
+            (s.lineno for s in statements if hasattr(s, "lineno")), None
+        )
+        if body_lo is None:
+            return statements
+        body_hi = next(
+            s.lineno for s in reversed(statements) if hasattr(s, "lineno")
         )
-        node.body = self._process_body(node.body)
-        return self.generic_visit(node)
-
-    def visit_ClassDef(self, node: ast.ClassDef) -> ast.ClassDef:
-        node.body = self._process_body(node.body)
-        return self.generic_visit(node)
-
-    def visit_If(self, node: ast.If) -> ast.If:
-        node.body = self._inject_events(node.body)
-        if node.orelse:
-            node.orelse = self._inject_events(node.orelse)
-        return self.generic_visit(node)
-
-    def visit_For(self, node: ast.For) -> ast.For:
-        node.body = self._inject_events(node.body)
-        if node.orelse:
-            node.orelse = self._inject_events(node.orelse)
-        return self.generic_visit(node)
-
-    def visit_While(self, node: ast.While) -> ast.While:
-        node.body = self._inject_events(node.body)
-        if node.orelse:
-            node.orelse = self._inject_events(node.orelse)
-        return self.generic_visit(node)
-
-    def visit_With(self, node: ast.With) -> ast.With:
-        node.body = self._inject_events(node.body)
-        return self.generic_visit(node)
 
-    def _process_body(self, statements: List[ast.stmt]) -> List[ast.stmt]:
-        """Common processing for statement bodies: wrap ranges then inject events."""
-        statements = self._wrap_ranges(statements)
-        return self._inject_events(statements)
+        keys = self._range_start_keys
+        if keys:
+            idx = bisect.bisect_left(keys, body_lo)
+            if idx < len(keys) and keys[idx] <= body_hi:
+                statements = self._wrap_ranges(statements)
+
+        if self._event_lo <= body_hi and self._event_hi >= body_lo:
+            statements = self._inject_events(statements)
+        return statements
 
     def _inject_events(self, statements: List[ast.stmt]) -> List[ast.stmt]:
         """Inject arbitrary expressions for events."""
+        # Bind hot lookups to locals: this loop runs once per statement in the
+        # file, so repeated self./global attribute loads add up.
         result = []
+        append = result.append
+        extend = result.extend
+        events = self.events
+        deepcopy = copy.deepcopy
+        debug = self._debug
+        lo, hi = self._event_lo, self._event_hi
         for stmt in statements:
-            if hasattr(stmt, "lineno") and stmt.lineno in self.events:
-                event = self.events[stmt.lineno]
-                logger.debug(f"Injecting event at line {stmt.lineno}: {event.expr}")
-
-                try:
-                    # Try parsing as an expression first (for simple cases like function calls)
-                    try:
-                        parsed = ast.parse(event.expr, mode="eval")
-                        expr_stmt = ast.Expr(value=parsed.body)
-                    except SyntaxError:
-                        # If expression parsing fails, try as statement(s)
-                        parsed = ast.parse(event.expr, mode="exec")
-                        if len(parsed.body) == 1:
-                            expr_stmt = parsed.body[0]
-                        else:
-                            # Multiple statements - we'll insert all of them
-                            if event.post:
-                                result.extend([stmt] + parsed.body)
-                            else:
-                                result.extend(parsed.body + [stmt])
-                            continue
-                except SyntaxError as e:
+            lineno = getattr(stmt, "lineno", None)
+            if lineno is not None and lo <= lineno <= hi and lineno in events:
+                if getattr(stmt, "_njkt_synthesized", False):
+                    # Range wrapper sharing the event's line; the event is
+                    # injected inside its body instead
+                    append(stmt)
+                    continue
+                event = events[lineno]
+                if self._debug:
+                    logger.debug(f"Injecting event at line {lineno}: {event.expr}")
+
+                parsed = event._parsed_expr
+                if parsed is None:
                     logger.error(
-                        f"Invalid syntax in event at line {stmt.lineno}: {event.expr}"
+                        f"Invalid syntax in event at line {lineno}: {event.expr}"
                     )
-                    logger.error(f"Syntax error: {e}")
                     # Skip this event if the expression is invalid
-                    result.append(stmt)
+                    append(stmt)
+                    continue
+
+                if isinstance(parsed, ast.Expression):
+                    # Locate the injected statement at its anchor; the value
+                    # subtree already carries locations from its own parse.
+                    expr_stmt = ast.copy_location(
+                        ast.Expr(value=deepcopy(parsed.body)), stmt
+                    )
+                elif len(parsed) == 1:
+                    expr_stmt = deepcopy(parsed[0])
+                else:
+                    # Multiple statements - we'll insert all of them
+                    stmts = deepcopy(parsed)
+                    if event.post:
+                        extend([stmt] + stmts)
+                    else:
+                        extend(stmts + [stmt])
                     continue
 
                 if event.post:
-                    result.extend([stmt, expr_stmt])
+                    extend([stmt, expr_stmt])
                 else:
-                    result.extend([expr_stmt, stmt])
+                    extend([expr_stmt, stmt])
             else:
-                if hasattr(stmt, "lineno"):
-                    logger.debug(f"No event for line {stmt.lineno}")
-                result.append(stmt)
+                if debug and lineno is not None:
+                    logger.debug(f"No event for line {lineno}")
+                append(stmt)
         return result
 
     def _wrap_ranges(self, statements: List[ast.stmt]) -> List[ast.stmt]:
@@ -160,63 +320,80 @@ class CodeTransformer(ast.NodeTransformer):
 
         result = []
         i = 0
+        n = len(statements)
+        range_starts = self._range_starts
 
-        while i < len(statements):
+        while i < n:
             stmt = statements[i]
             stmt_line = getattr(stmt, "lineno", None)
 
             # Check if this statement starts a context manager range
-            matching_range = next(
-                (
-                    r
-                    for r in self.ranges
-                    if stmt_line == r.start_line
-                    and (r.start_line, r.end_line, r.context) not in self.applied_ranges
-                ),
-                None,
-            )
+            matching_range = None
+            if stmt_line is not None:
+                for r in range_starts.get(stmt_line, ()):
+                    if not r._applied:
+                        matching_range = r
+                        break
 
             if matching_range:
-                # Mark range as applied
-                self.applied_ranges.add(
-                    (
-                        matching_range.start_line,
-                        matching_range.end_line,
-                        matching_range.context,
-                    )
-                )
-
-                # Collect all statements in the range
-                range_stmts = [
-                    s
-                    for s in statements[i:]
-                    if hasattr(s, "lineno")
-                    and matching_range.start_line <= s.lineno <= matching_range.end_line
+                # Fuse every unapplied range covering the exact same span into
+                # one `with a, b, c:` — a single With node and a single frame
+                # setup at runtime instead of N nested ones.
+                end_line = matching_range.end_line
+                fused_ranges = [
+                    r
+                    for r in range_starts[stmt_line]
+                    if not r._applied and r.end_line == end_line
                 ]
 
-                # Skip past all statements in this range
-                i += len(
-                    [
-                        s
-                        for s in statements[i:]
-                        if hasattr(s, "lineno") and s.lineno <= matching_range.end_line
-                    ]
-                )
-
-                try:
-                    # Create with statement
-                    context_expr = ast.parse(matching_range.context, mode="eval").body
-                    with_stmt = ast.With(
-                        items=[
-                            ast.withitem(context_expr=context_expr, optional_vars=None)
-                        ],
-                        body=range_stmts,
+                # Mark ranges as applied
+                for r in fused_ranges:
+                    object.__setattr__(r, "_applied", True)
+
+                # Collect all statements in the range, advancing i in the same
+                # pass — statements arrive in source order, so one forward walk
+                # suffices.
+                range_stmts = []
+                while (
+                    i < n
+                    and getattr(statements[i], "lineno", end_line + 1) <= end_line
+                ):
+                    range_stmts.append(statements[i])
+                    i += 1
+
+                items = []
+                anchor = range_stmts[0]
+                for r in fused_ranges:
+                    if r._parsed_context is not None:
+                        context_expr = copy.deepcopy(r._parsed_context)
+                        # Hand-built context ASTs carry no locations at all;
+                        # anchor them at the first wrapped statement. This
+                        # walks only the small context expression.
+                        ast.copy_location(context_expr, anchor)
+                        ast.fix_missing_locations(context_expr)
+                        items.append(
+                            ast.withitem(
+                                context_expr=context_expr,
+                                optional_vars=None,
+                            )
+                        )
+                    else:
+                        logger.warning(
+                            f"Failed to create context manager for '{r.context}': invalid syntax"
+                        )
+
+                if items:
+                    # Create with statement, located at the span it wraps.
+                    # Tagged so the injection pass over this same body skips
+                    # it: carrying the anchor's lineno must not make the
+                    # wrapper itself match an event — the event is injected
+                    # inside the body when the walker descends into it.
+                    with_stmt = ast.copy_location(
+                        ast.With(items=items, body=range_stmts), anchor
                     )
+                    with_stmt._njkt_synthesized = True
                     result.append(with_stmt)
-                except (SyntaxError, ValueError) as e:
-                    logger.warning(
-                        f"Failed to create context manager for '{matching_range.context}': {e}"
-                    )
+                else:
                     result.extend(range_stmts)
             else:
                 # Regular statement, add as-is
@@ -226,8 +403,84 @@ class CodeTransformer(ast.NodeTransformer):
         return result
 
 
+# One transformer per configured file, reused across transforms of that file
+# in the same process — skips re-sorting ranges and rebuilding the event/range
+# indices when e.g. transform_only and run touch the same script. Entries also
+# keep the config they were built from, so a different config for the same
+# path rebuilds instead of reusing stale indices.
+_transformers_by_path: Dict[str, Any] = {}
+
+
+def _get_transformer(file_path: str, file_config: Dict[str, Any]) -> CodeTransformer:
+    """Return a (reset) cached transformer for file_path, creating it on first use."""
+    cached = _transformers_by_path.get(file_path)
+    if cached is not None and cached[0] is file_config:
+        transformer = cached[1]
+        transformer.reset()
+        return transformer
+
+    transformer = CodeTransformer(file_config["events"], file_config["ranges"])
+    _transformers_by_path[file_path] = (file_config, transformer)
+    return transformer
+
+
+# On-disk cache of transformed code objects, keyed by source + config so any
+# change to either invalidates the entry (same idea as Python's __pycache__).
+_CODE_CACHE_DIR = Path.home() / ".cache" / "njkt"
+
+
+def _compile_cached(
+    source_code: Union[str, bytes], file_path: str, file_config: Dict[str, Any]
+):
+    """
+    Transform and compile source code, memoizing the resulting code object on
+    disk keyed by (source, config). Repeated runs on an unchanged file skip
+    parse/transform/compile entirely.
+    """
+    key = hashlib.blake2b(
+        (source_code if isinstance(source_code, bytes) else source_code.encode())
+        + json.dumps(file_config, sort_keys=True, default=str).encode()
+        + f"optimize={_optimize_level}".encode(),
+        digest_size=16,
+    ).hexdigest()
+    cache_path = _CODE_CACHE_DIR / f"{key}.pyc"
+
+    try:
+        data = cache_path.read_bytes()
+        magic = importlib.util.MAGIC_NUMBER
+        if data[: len(magic)] == magic:
+            logger.debug("Code cache hit for %s", file_path)
+            return marshal.loads(data[len(magic) :])
+    except (OSError, EOFError, ValueError):
+        pass
+
+    tree = _parse_module(source_code, file_path)
+    transformer = _get_transformer(file_path, file_config)
+    # New nodes receive their locations at construction time, so no
+    # whole-tree fix_missing_locations pass is needed here.
+    transformed = transformer.walk(tree)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Transformed {file_path}:")
+        logger.debug("\n" + ast.unparse(transformed))
+
+    # dont_inherit keeps this module's future flags out of the target's code
+    code = compile(
+        transformed, file_path, "exec", dont_inherit=True, optimize=_optimize_level
+    )
+
+    try:
+        _CODE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cache_path.write_bytes(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+    except (OSError, ValueError):
+        # Caching is best-effort; an unwritable cache dir must not break runs
+        pass
+
+    return code
+
+
 def transform_and_execute(
-    source_code: str,
+    source_code: Union[str, bytes],
     file_path: str,
     file_config: Dict[str, Any],
     execution_globals: Optional[Dict[str, Any]] = None,
@@ -236,22 +489,13 @@ def transform_and_execute(
     Transform source code and execute it. Returns True if successful, False if transformation failed.
 
     Args:
-        source_code: The Python source code to transform
+        source_code: The Python source code to transform (str or raw bytes)
         file_path: Path to the file being transformed (for debugging and compilation)
         file_config: Configuration containing events and ranges
         execution_globals: Globals dict for execution (if None, creates a new module dict)
     """
     try:
-        tree = ast.parse(source_code, filename=file_path)
-        transformer = CodeTransformer(file_config["events"], file_config["ranges"])
-        transformed = transformer.visit(tree)
-        ast.fix_missing_locations(transformed)
-
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"Transformed {file_path}:")
-            logger.debug("\n" + ast.unparse(transformed))
-
-        code = compile(transformed, file_path, "exec")
+        code = _compile_cached(source_code, file_path, file_config)
 
         if execution_globals is not None:
             exec(code, execution_globals)
@@ -273,6 +517,80 @@ def transform_and_execute(
         return False
 
 
+class _TransformLoader(Loader):
+    """Loader that executes a configured module through the transform pipeline."""
+
+    def __init__(self, path: str, file_config: Dict[str, Any]):
+        self.path = path
+        self.file_config = file_config
+
+    def create_module(self, spec):
+        return None  # use default module creation
+
+    def exec_module(self, module):
+        # Read raw bytes — ast.parse and compile handle PEP 263 encoding
+        # declarations natively.
+        source = Path(self.path).read_bytes()
+
+        if not transform_and_execute(
+            source, self.path, self.file_config, module.__dict__
+        ):
+            # Fall back to original execution without transformation
+            logger.info(f"Falling back to normal execution for {self.path}")
+            code = compile(source, self.path, "exec")
+            exec(code, module.__dict__)
+
+
+class NjktFinder(MetaPathFinder):
+    """Meta path finder that intercepts imports of configured files only.
+
+    Unlike patching SourceFileLoader.exec_module globally, this leaves every
+    non-configured import on the stdlib fast path (including .pyc caching) and
+    rejects non-candidates with a single set membership test.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        # A configured file /a/b/foo.py can only be imported as a module whose
+        # last name component is 'foo' — or, for a package's __init__.py, the
+        # package (directory) name — so most imports are rejected without
+        # touching the filesystem.
+        self._module_names = set()
+        for p in config:
+            path = Path(p)
+            self._module_names.add(
+                path.parent.name if path.stem == "__init__" else path.stem
+            )
+        # realpath walks the filesystem (stat/readlink per component); cache it
+        # per raw origin so repeated imports of the same file stay in memory.
+        self._realpath_cache: Dict[str, str] = {}
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.rpartition(".")[2] not in self._module_names:
+            return None
+
+        spec = PathFinder.find_spec(fullname, path, target)
+        if spec is None or not spec.origin:
+            return None
+
+        # Configured paths are already resolved, so an exact match needs no
+        # filesystem work at all; only near-misses pay for (cached) realpath.
+        file_config = self.config.get(spec.origin)
+        if file_config is None:
+            resolved = self._realpath_cache.get(spec.origin)
+            if resolved is None:
+                resolved = os.path.realpath(spec.origin)
+                self._realpath_cache[spec.origin] = resolved
+            file_config = self.config.get(resolved)
+        if file_config is None:
+            return None
+
+        # Reuse the found spec (origin, package search locations, etc.) and
+        # only swap in the transforming loader.
+        spec.loader = _TransformLoader(spec.origin, file_config)
+        return spec
+
+
 class SimpleImportHook:
     """Minimal import hook that transforms files with events."""
 
@@ -282,40 +600,16 @@ class SimpleImportHook:
     @contextmanager
     def install(self):
         """Context manager to temporarily install the import hook."""
-        from importlib.machinery import SourceFileLoader
-
-        original_exec_module = SourceFileLoader.exec_module
-
-        def patched_exec_module(self, module):
-            file_path = str(Path(self.path).resolve())
-
-            if file_path in hook.config:
-                # Transform the file
-                with open(self.path, "r") as f:
-                    source = f.read()
-
-                file_config = hook.config[file_path]
-                if transform_and_execute(
-                    source, self.path, file_config, module.__dict__
-                ):
-                    return
-                else:
-                    # Fall back to original execution without transformation
-                    logger.info(f"Falling back to normal execution for {file_path}")
-                    code = compile(source, self.path, "exec")
-                    exec(code, module.__dict__)
-                    return
-
-            # Fall back to original behavior
-            original_exec_module(self, module)
-
-        hook = self
-        SourceFileLoader.exec_module = patched_exec_module
+        finder = NjktFinder(self.config)
+        sys.meta_path.insert(0, finder)
 
         try:
             yield
         finally:
-            SourceFileLoader.exec_module = original_exec_module
+            try:
+                sys.meta_path.remove(finder)
+            except ValueError:
+                pass
 
 
 def transform_only(config: Dict[str, Any], script: Path) -> str:
@@ -330,31 +624,30 @@ def transform_only(config: Dict[str, Any], script: Path) -> str:
         Transformed source code as a string
     """
     script_path_resolved = str(script.resolve())
-    
-    # Read the source code
-    with open(script) as f:
-        source = f.read()
-    
+
+    # Read the source raw; ast.parse handles PEP 263 encoding declarations on
+    # bytes, so only the untransformed fallback needs decoding.
+    source = Path(script).read_bytes()
+
     # Check if we need to transform this script
     if script_path_resolved in config:
         file_config = config[script_path_resolved]
-        
+
         try:
-            tree = ast.parse(source, filename=str(script))
-            transformer = CodeTransformer(file_config["events"], file_config["ranges"])
-            transformed = transformer.visit(tree)
-            ast.fix_missing_locations(transformed)
-            
+            tree = _parse_module(source, str(script))
+            transformer = _get_transformer(script_path_resolved, file_config)
+            transformed = transformer.walk(tree)
+
             # Return the transformed code as a string
             return ast.unparse(transformed)
-            
+
         except (SyntaxError, ValueError, TypeError) as e:
             logger.error(f"Failed to transform {script}: {e}")
             # Return original code if transformation fails
-            return source
+            return source.decode()
     else:
         # No transformation needed, return original code
-        return source
+        return source.decode()
 
 
 def run(config: Dict[str, Any], script: Path, script_args: List[str]):
@@ -369,26 +662,25 @@ def run(config: Dict[str, Any], script: Path, script_args: List[str]):
     try:
         hook = SimpleImportHook(config)
         script_path_resolved = str(script.resolve())
+        # Read the entry script exactly once; every execution path below reuses
+        # this buffer instead of re-opening and re-parsing the file.
+        source = Path(script).read_bytes()
+        script_globals = {"__name__": "__main__", "__file__": str(script)}
+
         with hook.install():
-            # Check if we need to transform the entry script
-            if script_path_resolved in hook.config:
+            file_config = hook.config.get(script_path_resolved)
+            if file_config is not None:
                 # Transform and execute the entry script directly
-                with open(script) as f:
-                    source = f.read()
-
                 logger.info(f"Transforming entry script: {script}")
-                file_config = hook.config[script_path_resolved]
-                script_globals = {"__name__": "__main__", "__file__": str(script)}
-
                 if not transform_and_execute(
                     source, str(script), file_config, script_globals
                 ):
                     # Fallback to normal execution if transformation failed
                     logger.info("Falling back to normal execution")
-                    runpy.run_path(str(script), run_name="__main__")
+                    exec(compile(source, str(script), "exec"), script_globals)
             else:
-                # No transformation needed, run normally
-                runpy.run_path(str(script), run_name="__main__")
+                # No transformation needed, run as-is
+                exec(compile(source, str(script), "exec"), script_globals)
     finally:
         # Restore original sys.path[0]
         sys.path[0] = original_path_0
\ No newline at end of file
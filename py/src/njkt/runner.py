@@ -6,6 +6,8 @@ This tool takes VS Code NVTX range definitions and transforms Python scripts
 to include NVTX markers for GPU profiling.
 """
 
+import ast
+import copy
 import json
 import argparse
 import sys
@@ -16,19 +18,65 @@ from collections import defaultdict
 
 from .lib import Event, ContextRange, run, transform_only
 
+# orjson is much faster on large range files; fall back to stdlib json
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+# Shared across every configured file: the injected import is identical
+# everywhere and Event pre-parses its expression once at construction, so a
+# single instance (and a single parsed AST) serves all files. The transformer
+# only ever deepcopies the parsed node, never mutates the event.
+_IMPORT_TORCH_EVENT = Event(
+    line=1,
+    expr="import torch",
+    post=False,  # Insert before line 1
+)
+
+# Attribute chain torch.cuda.nvtx.range, shared by every range's Call node.
+# The transformer deepcopies contexts before emitting them, so sharing the
+# prefix across ContextRanges is safe.
+_NVTX_RANGE_FUNC = ast.Attribute(
+    value=ast.Attribute(
+        value=ast.Attribute(
+            value=ast.Name(id='torch', ctx=ast.Load()),
+            attr='cuda',
+            ctx=ast.Load(),
+        ),
+        attr='nvtx',
+        ctx=ast.Load(),
+    ),
+    attr='range',
+    ctx=ast.Load(),
+)
+
+
+def _nvtx_range_call(range_name: str) -> ast.Call:
+    """Build torch.cuda.nvtx.range('<name>') as an AST node directly."""
+    return ast.Call(
+        func=copy.deepcopy(_NVTX_RANGE_FUNC),
+        args=[ast.Constant(value=range_name)],
+        keywords=[],
+    )
+
 
 def load_nvtx_ranges(ranges_file: Path) -> List[Dict[str, Any]]:
     """Load NVTX ranges from the VS Code extension JSON format."""
     try:
-        with open(ranges_file, 'r') as f:
-            ranges = json.load(f)
+        # Parse raw bytes directly: no TextIOWrapper, and orjson (when
+        # installed) validates/decodes UTF-8 internally.
+        ranges = _loads(ranges_file.read_bytes())
         logger.info(f"Loaded {len(ranges)} NVTX ranges from {ranges_file}")
         return ranges
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+    except (FileNotFoundError, ValueError) as e:
+        # json.JSONDecodeError and orjson.JSONDecodeError both subclass ValueError
         logger.error(f"Failed to load NVTX ranges from {ranges_file}: {e}")
         raise
 
@@ -47,35 +95,33 @@ def create_njkt_config_from_nvtx_ranges(nvtx_ranges: List[Dict[str, Any]]) -> Di
         if not nvtx_range.get('isEnabled', True):
             continue
             
-        file_path = str(Path(nvtx_range['filePath']).resolve())
+        # Interned so config dict lookups in the import hook compare pointers
+        file_path = sys.intern(str(Path(nvtx_range['filePath']).resolve()))
         range_name = nvtx_range['name']
         start_line = nvtx_range['startLine']
         end_line = nvtx_range['endLine']
         
-        # Create NVTX context manager expression
-        context_expr = f"torch.cuda.nvtx.range('{range_name}')"
-        
+        # Create NVTX context manager expression; the string form is kept for
+        # logging and cache keys, while the AST is built directly — no parse
+        # round-trip, and range names containing quotes cannot break anything.
+        context_expr = f"torch.cuda.nvtx.range({range_name!r})"
+
         # Create ContextRange object
         context_range = ContextRange(
             start_line=start_line,
             end_line=end_line,
             context=context_expr,
-            enabled=True
+            enabled=True,
+            context_ast=_nvtx_range_call(range_name)
         )
         
         ranges_by_file[file_path].append(context_range)
     
     # Create config in the format expected by lib.run()
     for file_path, ranges in ranges_by_file.items():
-        # Add import torch event for each file with NVTX ranges
-        import_event = Event(
-            line=1,
-            expr="import torch",
-            post=False  # Insert before line 1
-        )
-        
+        # Add the shared import torch event for each file with NVTX ranges
         config[file_path] = {
-            "events": [import_event],
+            "events": [_IMPORT_TORCH_EVENT],
             "ranges": ranges
         }
     